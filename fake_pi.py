@@ -1,8 +1,13 @@
 import websocket
 import logging
 import os
+import time
+import hashlib
 import requests
-from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import threading
+from concurrent.futures import ThreadPoolExecutor
 
 # =====================================================
 # Device Configuration
@@ -17,6 +22,35 @@ SERVER_HTTP_URL = "https://c784b905d3b6.ngrok-free.app"
 STORAGE_DIR = "device_storage"
 os.makedirs(STORAGE_DIR, exist_ok=True)
 
+# Resolved once at boot; download paths are built from this
+STORAGE_ROOT = os.path.abspath(STORAGE_DIR)
+
+# ETag sidecars and .part downloads live apart from media, so no media
+# name can clash with them (safe_name rejects dot-names like this one)
+META_ROOT = os.path.join(STORAGE_ROOT, ".meta")
+os.makedirs(META_ROOT, exist_ok=True)
+
+# WebSocket notification sent by the server when new media is uploaded
+NEW_CONTENT_PREFIX = "NEW_CONTENT:"
+
+# Server liveness probe (answered with PONG) and client-side protocol pings
+SERVER_PING_MESSAGE = "PING"
+SERVER_PONG_MESSAGE = "PONG"
+WS_PING_INTERVAL = 20
+WS_PING_TIMEOUT = 10
+
+# Streamed download chunk size (1 MiB keeps Python loop overhead low)
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+
+# Network reads are batched up to this size before each disk write
+WRITE_FLUSH_SIZE = 4 * 1024 * 1024
+
+# Downloads run off the WebSocket thread so notifications keep flowing
+MAX_PARALLEL_DOWNLOADS = 4
+
+# SD card budget for cached media (least recently used files go first)
+MAX_CACHE_BYTES = 500 * 1024 * 1024
+
 # =====================================================
 # Logging Configuration
 # =====================================================
@@ -28,116 +62,389 @@ logging.basicConfig(
 logger = logging.getLogger("SMART_AD_DEVICE")
 
 # =====================================================
-# Helper Function : Download File from Server
+# HTTP Session (keep-alive + connection pooling)
 # =====================================================
-def download_file(filename):
-    logger.info("=" * 60)
-    logger.info(f"[{DEVICE_ID}] DOWNLOAD WORKFLOW STARTED")
+SESSION = requests.Session()
 
-    file_url = f"{SERVER_HTTP_URL}/media/{filename}"
-    local_path = os.path.join(STORAGE_DIR, filename)
+# Without this ngrok answers unknown clients with an HTML warning page (200 OK)
+SESSION.headers["ngrok-skip-browser-warning"] = "1"
+
+http_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.3,
+        status_forcelist=[502, 503, 504]
+    )
+)
+SESSION.mount("http://", http_adapter)
+SESSION.mount("https://", http_adapter)
+
+# =====================================================
+# Helper Function : Filename Validation
+# =====================================================
+def safe_name(name):
+    # Drop any directory part so a notification can't write outside storage
+    name = os.path.basename(name)
+    if not name or name.startswith("."):
+        raise ValueError(f"Invalid filename: {name!r}")
+    return name
+
+# =====================================================
+# Helper Function : Raw File Writes
+# =====================================================
+PARTIAL_SUFFIX = ".part"
+
+# O_BINARY only exists (and matters) on Windows
+WRITE_FLAGS = os.O_WRONLY | os.O_CREAT | os.O_TRUNC | getattr(os, "O_BINARY", 0)
 
-    logger.info(f"[{DEVICE_ID}] Remote file URL : {file_url}")
-    logger.info(f"[{DEVICE_ID}] Local path        : {local_path}")
+def write_all(fd, data):
+    # Context manager releases the view so a bytearray buffer can be reused
+    with memoryview(data) as view:
+        offset = 0
+        while offset < len(view):
+            offset += os.write(fd, view[offset:])
+
+# =====================================================
+# Helper Function : ETag Sidecar Files
+# =====================================================
+ETAG_SUFFIX = ".etag"
 
-    # Cache check
-    if os.path.exists(local_path):
-        logger.warning(f"[{DEVICE_ID}] CACHE HIT | File already exists")
-        logger.info(f"[{DEVICE_ID}] Download skipped")
-        logger.info("=" * 60)
+def meta_path(filename, suffix):
+    return os.path.join(META_ROOT, filename + suffix)
+
+def read_etag(etag_path):
+    try:
+        with open(etag_path, "r") as f:
+            return f.read().strip() or None
+    except (OSError, ValueError):
+        return None
+
+def write_etag(etag_path, etag):
+    if not etag:
+        if os.path.exists(etag_path):
+            os.remove(etag_path)
+        return
+
+    with open(etag_path, "w") as f:
+        f.write(etag)
+
+# =====================================================
+# Helper Function : Cache Eviction (LRU by total bytes)
+# =====================================================
+# Download workers evict concurrently and touch files on cache hits
+eviction_lock = threading.Lock()
+
+def evict_until_under_limit(limit=MAX_CACHE_BYTES):
+    with eviction_lock:
+        _evict_until_under_limit(limit)
+
+def _evict_until_under_limit(limit):
+    entries = []
+    total_bytes = 0
+
+    with os.scandir(STORAGE_ROOT) as it:
+        for entry in it:
+            if not entry.is_file(follow_symlinks=False):
+                continue
+            st = entry.stat(follow_symlinks=False)
+            entries.append((st.st_mtime, st.st_size, entry.path))
+            total_bytes += st.st_size
+
+    if total_bytes <= limit:
         return
 
-    logger.info(f"[{DEVICE_ID}] CACHE MISS | Download required")
+    # mtime is refreshed on every cache hit, so oldest == least recently used
+    entries.sort()
+
+    for _, size, path in entries:
+        if total_bytes <= limit:
+            break
+        try:
+            os.remove(path)
+            etag_path = meta_path(os.path.basename(path), ETAG_SUFFIX)
+            if os.path.exists(etag_path):
+                os.remove(etag_path)
+            total_bytes -= size
+            logger.warning("[%s] CACHE EVICT | %s", DEVICE_ID, os.path.basename(path))
+        except OSError as e:
+            logger.error("[%s] CACHE EVICT FAILED | %s | %s", DEVICE_ID, path, e)
+
+# =====================================================
+# Download Errors
+# =====================================================
+# Downloaded bytes don't match the server's X-Content-SHA256
+class IntegrityError(Exception):
+    pass
+
+# =====================================================
+# Helper Function : Atomic Stream To Disk
+# =====================================================
+def stream_to_file(response, local_path, expected_sha256=None):
+    # Write to a .part file first so a crash never leaves a truncated
+    # file that the cache check would treat as complete
+    tmp_path = meta_path(os.path.basename(local_path), PARTIAL_SUFFIX)
+    bytes_written = 0
+    h = hashlib.sha256()
 
     try:
-        start_time = datetime.now()
-        logger.info(f"[{DEVICE_ID}] Sending HTTP GET request")
+        # Unbuffered fd: chunks go straight to the kernel, no BufferedWriter copy
+        fd = os.open(tmp_path, WRITE_FLAGS, 0o644)
+        try:
+            # Short network reads are coalesced so the SD card sees few large writes
+            buf = bytearray()
+            while True:
+                chunk = response.raw.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                h.update(chunk)
+                buf += chunk
+                bytes_written += len(chunk)
+                if len(buf) >= WRITE_FLUSH_SIZE:
+                    write_all(fd, buf)
+                    buf.clear()
 
-        response = requests.get(file_url, stream=True, timeout=15)
-        response.raise_for_status()
+            if buf:
+                write_all(fd, buf)
+
+            os.fsync(fd)
+
+            # Media is read once at playback; don't let it evict the page cache
+            if hasattr(os, "posix_fadvise"):
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+
+        if expected_sha256 and h.hexdigest() != expected_sha256.lower():
+            raise IntegrityError(
+                f"SHA256 mismatch: expected {expected_sha256}, got {h.hexdigest()}"
+            )
+
+        # Atomic rename: readers see either nothing or the complete file
+        os.replace(tmp_path, local_path)
+
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return bytes_written
+
+def sweep_partial_downloads():
+    with os.scandir(META_ROOT) as it:
+        for entry in it:
+            if entry.name.endswith(PARTIAL_SUFFIX):
+                os.remove(entry.path)
+                logger.warning("[%s] Removed partial download: %s", DEVICE_ID, entry.name)
+
+# =====================================================
+# Helper Function : Download File from Server
+# =====================================================
+def download_file(filename):
+    file_url = f"{SERVER_HTTP_URL}/media/{filename}"
+    local_path = os.path.join(STORAGE_ROOT, filename)
+
+    etag_path = meta_path(filename, ETAG_SUFFIX)
+    request_headers = {}
+
+    try:
+        # Cache check : revalidate with the stored ETag instead of trusting the name
+        cached_etag = read_etag(etag_path) if os.path.exists(local_path) else None
+        if cached_etag:
+            cache_state = "PRESENT | Revalidating ETag " + cached_etag
+            request_headers["If-None-Match"] = cached_etag
+        else:
+            cache_state = "MISS | Download required"
 
         logger.info(
-            f"[{DEVICE_ID}] HTTP Response OK | Status: {response.status_code}"
+            "[%s] DOWNLOAD WORKFLOW STARTED\n"
+            "    Remote file URL : %s\n"
+            "    Local path      : %s\n"
+            "    Cache           : %s",
+            DEVICE_ID, file_url, local_path, cache_state
+        )
+
+        start_ns = time.monotonic_ns()
+
+        response = SESSION.get(
+            file_url, headers=request_headers, stream=True, timeout=15
         )
 
-        bytes_written = 0
+        if response.status_code == 304:
+            response.close()
+            # Mark as recently used for LRU eviction
+            with eviction_lock:
+                try:
+                    os.utime(local_path, None)
+                except FileNotFoundError:
+                    evicted = True
+                else:
+                    evicted = False
+            if evicted:
+                # Evicted while revalidating: its ETag went with it, so this is a miss
+                logger.warning("[%s] Cached copy evicted, downloading again: %s", DEVICE_ID, filename)
+                return download_file(filename)
+            logger.info(
+                "[%s] CACHE HIT | Server copy unchanged | Download skipped: %s",
+                DEVICE_ID, filename
+            )
+            return
+
+        response.raise_for_status()
 
-        with open(local_path, "wb") as f:
-            for chunk in response.iter_content(chunk_size=8192):
-                if chunk:
-                    f.write(chunk)
-                    bytes_written += len(chunk)
+        # Leave room for the incoming file, not just the ones already stored
+        incoming_bytes = int(response.headers.get("Content-Length", 0))
+        evict_until_under_limit(max(0, MAX_CACHE_BYTES - incoming_bytes))
+
+        # Let urllib3 undo any gzip/deflate transfer encoding
+        response.raw.decode_content = True
+
+        bytes_written = stream_to_file(
+            response, local_path, response.headers.get("X-Content-SHA256")
+        )
+        write_etag(etag_path, response.headers.get("ETag"))
 
         size_kb = bytes_written / 1024
-        duration = (datetime.now() - start_time).total_seconds()
+        duration = (time.monotonic_ns() - start_ns) / 1e9
 
         logger.info(
-            f"[{DEVICE_ID}] DOWNLOAD SUCCESS | "
-            f"File: {filename} | Size: {size_kb:.2f} KB"
+            "[%s] DOWNLOAD SUCCESS | File: %s | Size: %.2f KB\n"
+            "    HTTP status     : %s\n"
+            "    Download time   : %.2f seconds\n"
+            "    Stored at       : %s\n"
+            "    File ready for playback",
+            DEVICE_ID, filename, size_kb, response.status_code,
+            duration, local_path
         )
 
-        logger.info(f"[{DEVICE_ID}] Download time: {duration:.2f} seconds")
-        logger.info(f"[{DEVICE_ID}] Stored at: {os.path.abspath(local_path)}")
-        logger.info(f"[{DEVICE_ID}] File ready for playback")
-        logger.info("=" * 60)
-
     except requests.exceptions.Timeout:
-        logger.error(f"[{DEVICE_ID}] DOWNLOAD FAILED | Timeout")
+        logger.error("[%s] DOWNLOAD FAILED | Timeout", DEVICE_ID)
 
     except requests.exceptions.HTTPError as e:
-        logger.error(f"[{DEVICE_ID}] HTTP ERROR | {str(e)}")
+        logger.error("[%s] HTTP ERROR | %s", DEVICE_ID, e)
+
+    except IntegrityError as e:
+        logger.error("[%s] INTEGRITY ERROR | %s | Download discarded", DEVICE_ID, e)
 
     except Exception as e:
-        logger.error(f"[{DEVICE_ID}] UNKNOWN ERROR | {str(e)}")
+        logger.error("[%s] UNKNOWN ERROR | %s", DEVICE_ID, e)
+
+# =====================================================
+# Download Scheduler (keeps WebSocket thread free)
+# =====================================================
+download_executor = ThreadPoolExecutor(
+    max_workers=MAX_PARALLEL_DOWNLOADS,
+    thread_name_prefix="download"
+)
+
+# filename -> "re-run once finished" flag for downloads in flight
+pending_downloads = {}
+pending_lock = threading.Lock()
+
+def schedule_download(filename):
+    with pending_lock:
+        if filename in pending_downloads:
+            # Re-uploaded mid-download: the in-flight copy may be stale,
+            # so fetch again once it is done
+            pending_downloads[filename] = True
+            logger.info("[%s] Download in progress, re-run queued: %s", DEVICE_ID, filename)
+            return
+        pending_downloads[filename] = False
+
+    submit_download(filename)
+    logger.info("[%s] Download queued: %s", DEVICE_ID, filename)
+
+def submit_download(filename):
+    def _done(future):
+        if not future.cancelled() and future.exception() is not None:
+            logger.error(
+                "[%s] DOWNLOAD CRASHED | %s | %r",
+                DEVICE_ID, filename, future.exception()
+            )
+
+        with pending_lock:
+            rerun = pending_downloads.pop(filename, False)
+            if rerun:
+                pending_downloads[filename] = False
+
+        if rerun:
+            logger.info("[%s] Re-running download: %s", DEVICE_ID, filename)
+            try:
+                submit_download(filename)
+            except RuntimeError:
+                # Executor already shut down (device stopping)
+                with pending_lock:
+                    pending_downloads.pop(filename, None)
+
+    future = download_executor.submit(download_file, filename)
+    future.add_done_callback(_done)
 
 # =====================================================
 # WebSocket Callbacks
 # =====================================================
 def on_open(ws):
-    logger.info("=" * 60)
-    logger.info(f"[{DEVICE_ID}] WebSocket CONNECTED")
-    logger.info(f"[{DEVICE_ID}] Device STATUS: ONLINE")
-    logger.info(f"[{DEVICE_ID}] Waiting for content notifications...")
-    logger.info("=" * 60)
+    logger.info(
+        "[%s] WebSocket CONNECTED | Device STATUS: ONLINE\n"
+        "    Waiting for content notifications...",
+        DEVICE_ID
+    )
 
 def on_message(ws, message):
-    logger.info("=" * 60)
-    logger.info(f"[{DEVICE_ID}] WebSocket MESSAGE RECEIVED")
-    logger.info(f"[{DEVICE_ID}] Payload: {message}")
-
-    if message.startswith("NEW_CONTENT:"):
-        filename = message.replace("NEW_CONTENT:", "").strip()
-        logger.info(f"[{DEVICE_ID}] New content assigned: {filename}")
-        download_file(filename)
+    # Server broadcasts notifications as binary frames
+    if isinstance(message, bytes):
+        message = message.decode("utf-8")
+
+    if message == SERVER_PING_MESSAGE:
+        ws.send(SERVER_PONG_MESSAGE)
+        return
+
+    if message.startswith(NEW_CONTENT_PREFIX):
+        filename = message.removeprefix(NEW_CONTENT_PREFIX).strip()
+        try:
+            filename = safe_name(filename)
+        except ValueError as e:
+            logger.warning("[%s] Rejected notification | %s", DEVICE_ID, e)
+            return
+
+        logger.info(
+            "[%s] WebSocket MESSAGE RECEIVED | Payload: %s\n"
+            "    New content assigned: %s",
+            DEVICE_ID, message, filename
+        )
+        schedule_download(filename)
     else:
-        logger.warning(f"[{DEVICE_ID}] Unknown message format")
-    logger.info("=" * 60)
+        logger.warning(
+            "[%s] WebSocket MESSAGE RECEIVED | Payload: %s\n"
+            "    Unknown message format",
+            DEVICE_ID, message
+        )
 
 def on_error(ws, error):
-    logger.error("=" * 60)
-    logger.error(f"[{DEVICE_ID}] WebSocket ERROR")
-    logger.error(f"[{DEVICE_ID}] Error: {error}")
-    logger.error("=" * 60)
+    logger.error("[%s] WebSocket ERROR | Error: %s", DEVICE_ID, error)
 
 def on_close(ws, close_status_code, close_msg):
-    logger.warning("=" * 60)
-    logger.warning(f"[{DEVICE_ID}] WebSocket DISCONNECTED")
-    logger.warning(f"[{DEVICE_ID}] Close Code: {close_status_code}")
-    logger.warning(f"[{DEVICE_ID}] Reason    : {close_msg}")
-    logger.warning(f"[{DEVICE_ID}] Device STATUS: OFFLINE")
-    logger.warning("=" * 60)
+    logger.warning(
+        "[%s] WebSocket DISCONNECTED | Device STATUS: OFFLINE\n"
+        "    Close Code: %s\n"
+        "    Reason    : %s",
+        DEVICE_ID, close_status_code, close_msg
+    )
 
 # =====================================================
 # Device Boot Simulation
 # =====================================================
 if __name__ == "__main__":
-    logger.info("=" * 60)
-    logger.info(f"[{DEVICE_ID}] FAKE RASPBERRY PI BOOTING")
-    logger.info(f"[{DEVICE_ID}] Storage initialized")
-    logger.info(f"[{DEVICE_ID}] Storage path: {os.path.abspath(STORAGE_DIR)}")
-    logger.info(f"[{DEVICE_ID}] Connecting to server...")
-    logger.info(f"[{DEVICE_ID}] WS URL: {SERVER_WS_URL}")
-    logger.info("=" * 60)
+    sweep_partial_downloads()
+
+    logger.info(
+        "[%s] FAKE RASPBERRY PI BOOTING\n"
+        "    Storage initialized\n"
+        "    Storage path: %s\n"
+        "    Connecting to server...\n"
+        "    WS URL: %s",
+        DEVICE_ID, STORAGE_ROOT, SERVER_WS_URL
+    )
 
     ws = websocket.WebSocketApp(
         SERVER_WS_URL,
@@ -147,4 +454,7 @@ if __name__ == "__main__":
         on_close=on_close
     )
 
-    ws.run_forever()
+    try:
+        ws.run_forever(ping_interval=WS_PING_INTERVAL, ping_timeout=WS_PING_TIMEOUT)
+    finally:
+        download_executor.shutdown(wait=True)
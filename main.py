@@ -1,15 +1,20 @@
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, UploadFile, File, Request
 from fastapi.staticfiles import StaticFiles
+from fastapi.responses import Response, FileResponse
+from starlette.concurrency import run_in_threadpool
 import os
+import time
+import hashlib
+import itertools
+import asyncio
 import logging
-from datetime import datetime
-import uuid
+from urllib.parse import quote
 
 # =====================================================
 # Logging Configuration
 # =====================================================
 logging.basicConfig(
-    level=logging.INFO,
+    level=os.environ.get("LOG_LEVEL", "INFO").upper(),
     format="%(asctime)s | %(levelname)s | %(message)s"
 )
 
@@ -27,41 +32,189 @@ app = FastAPI(title="LCD Smart Advertisement System")
 UPLOAD_DIR = "uploads"
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
-logger.info(f"📂 Upload directory ready: {os.path.abspath(UPLOAD_DIR)}")
+# Resolved once at boot; request paths are built from this
+UPLOAD_ROOT = os.path.abspath(UPLOAD_DIR)
 
-app.mount("/media", StaticFiles(directory=UPLOAD_DIR), name="media")
-logger.info("🌐 Static media endpoint mounted → /media")
+logger.info("📂 Upload directory ready: %s", UPLOAD_ROOT)
+
+# Uploads are streamed to disk in chunks instead of read fully into memory
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+# =====================================================
+# Media Digests (X-Content-SHA256 for device verification)
+# =====================================================
+# filename -> (st_mtime_ns, st_size, sha256 hex); recomputed if the file changes
+media_digests = {}
+
+def file_sha256(path):
+    h = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(UPLOAD_CHUNK_SIZE), b""):
+            h.update(block)
+    return h.hexdigest()
+
+async def media_digest(filename, path, stat_result):
+    cached = media_digests.get(filename)
+    if cached and cached[:2] == (stat_result.st_mtime_ns, stat_result.st_size):
+        return cached[2]
+
+    digest = await run_in_threadpool(file_sha256, path)
+    media_digests[filename] = (stat_result.st_mtime_ns, stat_result.st_size, digest)
+    return digest
+
+class MediaFiles(StaticFiles):
+    async def get_response(self, path, scope):
+        response = await super().get_response(path, scope)
+
+        if response.status_code == 200 and isinstance(response, FileResponse):
+            stat_result = response.stat_result or os.stat(response.path)
+            response.headers["X-Content-SHA256"] = await media_digest(
+                os.path.basename(response.path), response.path, stat_result
+            )
+
+        return response
+
+# =====================================================
+# Media Serving
+# =====================================================
+# When the server runs behind nginx, set MEDIA_ACCEL_PREFIX to an internal
+# location aliased to UPLOAD_DIR and nginx streams the file with sendfile:
+#
+#   location /_media/ {
+#       internal;
+#       alias /path/to/uploads/;
+#       sendfile on;
+#       tcp_nopush on;
+#       # nginx drops upstream headers on the internal redirect; pass the digest on
+#       add_header X-Content-SHA256 $upstream_http_x_content_sha256;
+#   }
+#
+MEDIA_ACCEL_PREFIX = os.environ.get("MEDIA_ACCEL_PREFIX")
+
+if MEDIA_ACCEL_PREFIX:
+    @app.get("/media/{filename}")
+    async def media_accel_redirect(filename: str):
+        try:
+            filename = safe_name(filename)
+        except ValueError:
+            return Response(status_code=404)
+
+        file_path = os.path.join(UPLOAD_ROOT, filename)
+        if not os.path.isfile(file_path):
+            return Response(status_code=404)
+
+        return Response(
+            headers={
+                "X-Accel-Redirect": MEDIA_ACCEL_PREFIX + quote(filename),
+                "X-Content-SHA256": await media_digest(
+                    filename, file_path, os.stat(file_path)
+                )
+            }
+        )
+
+    logger.info("🌐 Media served by nginx X-Accel-Redirect → %s", MEDIA_ACCEL_PREFIX)
+else:
+    app.mount("/media", MediaFiles(directory=UPLOAD_DIR), name="media")
+    logger.info("🌐 Static media endpoint mounted → /media")
 
 # =====================================================
 # Active WebSocket Connections
 # =====================================================
-active_connections = []
+# Each screen maps to its session's stop signal; setting it ends the
+# session so the socket is closed and the device reconnects
+active_connections: dict[WebSocket, asyncio.Event] = {}
+
+# Dead peers (e.g. dropped ngrok tunnels) are detected by a periodic PING:
+# a half-open socket still accepts sends, so the screen must answer PONG
+# (or send anything else) within PING_TIMEOUT
+PING_MESSAGE = "PING"
+PONG_MESSAGE = "PONG"
+PING_INTERVAL = 15
+PING_TIMEOUT = 5
+BROADCAST_SEND_TIMEOUT = 2
+CLOSE_TIMEOUT = 2
+
+def drop_connection(websocket: WebSocket):
+    stop = active_connections.pop(websocket, None)
+    if stop is not None:
+        stop.set()
+
+# =====================================================
+# Request IDs (cheap counter, random start per boot)
+# =====================================================
+_REQ_ID = itertools.count(int.from_bytes(os.urandom(4), "big"))
+
+def next_request_id():
+    return format(next(_REQ_ID) & 0xFFFFFFFF, "08x")
 
 # =====================================================
 # Middleware : API Request Logger
 # =====================================================
-@app.middleware("http")
-async def log_http_requests(request: Request, call_next):
-    request_id = str(uuid.uuid4())[:8]
-    start_time = datetime.now()
+# Plain ASGI middleware: BaseHTTPMiddleware would pipe every response body
+# (including /media downloads) through an extra memory stream
+class RequestLogMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        # Media downloads are the hot path: no per-request bookkeeping
+        if (
+            scope["type"] != "http"
+            or scope["path"].startswith("/media/")
+            or not logger.isEnabledFor(logging.DEBUG)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        request = Request(scope)
+        request_id = next_request_id()
+        start_ns = time.monotonic_ns()
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        await self.app(scope, receive, send_with_status)
+
+        duration = (time.monotonic_ns() - start_ns) / 1e9
+
+        logger.debug(
+            "HTTP %s | %s %s | Client: %s -> %s in %.3f sec",
+            request_id,
+            request.method,
+            request.url,
+            request.client.host if request.client else "UNKNOWN",
+            status_code,
+            duration
+        )
 
-    logger.info("=" * 80)
-    logger.info(f"➡️  HTTP REQUEST STARTED | ID: {request_id}")
-    logger.info(f"Method: {request.method}")
-    logger.info(f"URL: {request.url}")
-    logger.info(f"Client: {request.client.host if request.client else 'UNKNOWN'}")
+app.add_middleware(RequestLogMiddleware)
 
-    response = await call_next(request)
+# =====================================================
+# WebSocket Helpers
+# =====================================================
+async def receive_messages(websocket: WebSocket, client_ip, seen: asyncio.Event):
+    while True:
+        data = await websocket.receive_text()
+        seen.set()
 
-    end_time = datetime.now()
-    duration = (end_time - start_time).total_seconds()
+        if data == PONG_MESSAGE:
+            continue
 
-    logger.info(f"⬅️  HTTP REQUEST COMPLETED | ID: {request_id}")
-    logger.info(f"Status Code: {response.status_code}")
-    logger.info(f"Processing Time: {duration:.3f} sec")
-    logger.info("=" * 80)
+        logger.info(
+            "💓 HEARTBEAT / MESSAGE | From: %s | Payload: %s", client_ip, data
+        )
 
-    return response
+async def keepalive(websocket: WebSocket, seen: asyncio.Event):
+    while True:
+        await asyncio.sleep(PING_INTERVAL)
+        seen.clear()
+        await asyncio.wait_for(websocket.send_text(PING_MESSAGE), timeout=PING_TIMEOUT)
+        # Raises TimeoutError when the screen stays silent
+        await asyncio.wait_for(seen.wait(), timeout=PING_TIMEOUT)
 
 # =====================================================
 # WebSocket Endpoint (Screens)
@@ -72,103 +225,174 @@ async def websocket_endpoint(websocket: WebSocket):
 
     logger.info("=" * 80)
     logger.info("🔌 WEBSOCKET CONNECTION REQUEST")
-    logger.info(f"Client IP: {client_ip}")
+    logger.info("Client IP: %s", client_ip)
 
     await websocket.accept()
-    active_connections.append(websocket)
+    stop = asyncio.Event()
+    active_connections[websocket] = stop
 
     logger.info("✅ WEBSOCKET ACCEPTED")
-    logger.info(f"📺 Active Screens Connected: {len(active_connections)}")
+    logger.info("📺 Active Screens Connected: %d", len(active_connections))
     logger.info("=" * 80)
 
+    seen = asyncio.Event()
+    receiver = asyncio.create_task(receive_messages(websocket, client_ip, seen))
+    pinger = asyncio.create_task(keepalive(websocket, seen))
+    stopper = asyncio.create_task(stop.wait())
+
     try:
-        while True:
-            data = await websocket.receive_text()
-            logger.info(
-                f"💓 HEARTBEAT / MESSAGE | From: {client_ip} | Payload: {data}"
-            )
+        # Whichever side fails first (peer closed / PING stuck / dropped by
+        # a broadcast) ends the session
+        done, _ = await asyncio.wait(
+            {receiver, pinger, stopper}, return_when=asyncio.FIRST_COMPLETED
+        )
+        for task in done:
+            task.result()
+
+        if stopper in done:
+            logger.warning("=" * 80)
+            logger.warning("⌛ WEBSOCKET UNRESPONSIVE | Broadcast timed out, screen dropped")
+            logger.warning("Client IP: %s", client_ip)
+            logger.warning("Remaining Screens: %d", len(active_connections))
+            logger.warning("=" * 80)
+
+            # Close so the device notices and reconnects; a stuck peer
+            # is left to the server to tear down when we return
+            try:
+                await asyncio.wait_for(websocket.close(code=1011), timeout=CLOSE_TIMEOUT)
+            except Exception:
+                pass
 
     except WebSocketDisconnect:
-        if websocket in active_connections:
-            active_connections.remove(websocket)
+        active_connections.pop(websocket, None)
 
         logger.warning("=" * 80)
         logger.warning("❌ WEBSOCKET DISCONNECTED")
-        logger.warning(f"Client IP: {client_ip}")
-        logger.warning(f"Remaining Screens: {len(active_connections)}")
+        logger.warning("Client IP: %s", client_ip)
+        logger.warning("Remaining Screens: %d", len(active_connections))
+        logger.warning("=" * 80)
+
+    except asyncio.TimeoutError:
+        active_connections.pop(websocket, None)
+
+        logger.warning("=" * 80)
+        logger.warning("⌛ WEBSOCKET UNRESPONSIVE | No PONG received, screen dropped")
+        logger.warning("Client IP: %s", client_ip)
+        logger.warning("Remaining Screens: %d", len(active_connections))
         logger.warning("=" * 80)
 
     except Exception as e:
         logger.error("=" * 80)
         logger.error("🔥 WEBSOCKET ERROR")
-        logger.error(f"Client IP: {client_ip}")
-        logger.error(f"Error: {str(e)}")
+        logger.error("Client IP: %s", client_ip)
+        logger.error("Error: %s", e)
         logger.error("=" * 80)
 
+    finally:
+        receiver.cancel()
+        pinger.cancel()
+        stopper.cancel()
+        active_connections.pop(websocket, None)
+
+# =====================================================
+# Helper : Filename Validation
+# =====================================================
+def safe_name(name):
+    # Drop any directory part so uploads can't escape UPLOAD_ROOT
+    name = os.path.basename(name or "")
+    if not name or name.startswith("."):
+        raise ValueError(f"Invalid filename: {name!r}")
+    return name
+
+# =====================================================
+# Helper : Stream Upload To Disk (runs in threadpool)
+# =====================================================
+def save_upload(src, file_path):
+    # Hash while copying: the bytes are already in hand, so it's one pass
+    h = hashlib.sha256()
+    with open(file_path, "wb") as f:
+        for block in iter(lambda: src.read(UPLOAD_CHUNK_SIZE), b""):
+            h.update(block)
+            f.write(block)
+        return f.tell(), h.hexdigest()
+
 # =====================================================
 # File Upload API (Admin Panel)
 # =====================================================
 @app.post("/upload")
 async def upload_file(file: UploadFile = File(...)):
-    request_id = str(uuid.uuid4())[:8]
-    start_time = datetime.now()
+    request_id = next_request_id()
+    start_ns = time.monotonic_ns()
 
     logger.info("=" * 80)
-    logger.info(f"📤 UPLOAD API STARTED | Request ID: {request_id}")
+    logger.info("📤 UPLOAD API STARTED | Request ID: %s", request_id)
 
     try:
-        logger.info(f"📄 Filename Received: {file.filename}")
-        logger.info(f"📦 Content-Type: {file.content_type}")
+        logger.info("📄 Filename Received: %s", file.filename)
+        logger.info("📦 Content-Type: %s", file.content_type)
 
-        file_path = os.path.join(UPLOAD_DIR, file.filename)
-        logger.info(f"📍 Target Storage Path: {file_path}")
+        filename = safe_name(file.filename)
+        file_path = os.path.join(UPLOAD_ROOT, filename)
+        logger.info("📍 Target Storage Path: %s", file_path)
 
-        logger.info("📥 Reading file into memory")
-        contents = await file.read()
-        file_size_kb = len(contents) / 1024
+        logger.info("💾 Streaming file to disk")
+        file_size, digest = await run_in_threadpool(save_upload, file.file, file_path)
+        file_size_kb = file_size / 1024
 
-        logger.info(f"📊 File Size: {file_size_kb:.2f} KB")
-
-        logger.info("💾 Writing file to disk")
-        with open(file_path, "wb") as f:
-            f.write(contents)
+        st = os.stat(file_path)
+        media_digests[filename] = (st.st_mtime_ns, st.st_size, digest)
 
+        logger.info("📊 File Size: %.2f KB", file_size_kb)
         logger.info("✅ File successfully saved")
 
         # WebSocket notification
         notified = 0
         logger.info("📡 Broadcasting update to connected screens")
 
-        for ws in active_connections:
-            await ws.send_text(f"NEW_CONTENT:{file.filename}")
-            notified += 1
-            logger.info("➡️ Notification sent to one screen")
-
-        logger.info(
-            f"📢 Broadcast completed | Screens notified: {notified}"
+        # Encode once, reuse the same buffer for every screen
+        payload = f"NEW_CONTENT:{filename}".encode("utf-8")
+
+        # Snapshot: sockets may connect/disconnect while we are awaiting
+        targets = list(active_connections)
+        results = await asyncio.gather(
+            *(
+                asyncio.wait_for(ws.send_bytes(payload), timeout=BROADCAST_SEND_TIMEOUT)
+                for ws in targets
+            ),
+            return_exceptions=True
         )
 
-        end_time = datetime.now()
-        duration = (end_time - start_time).total_seconds()
+        for ws, result in zip(targets, results):
+            if isinstance(result, Exception):
+                drop_connection(ws)
+                logger.warning("⚠️ Notification failed, screen dropped: %s", result)
+            else:
+                notified += 1
+
+        logger.info("📢 Broadcast completed | Screens notified: %d", notified)
+
+        duration = (time.monotonic_ns() - start_ns) / 1e9
 
-        logger.info(f"⏱️ Upload request completed in {duration:.2f} sec")
-        logger.info(f"📤 UPLOAD API SUCCESS | Request ID: {request_id}")
+        logger.info("⏱️ Upload request completed in %.2f sec", duration)
+        logger.info("📤 UPLOAD API SUCCESS | Request ID: %s", request_id)
         logger.info("=" * 80)
 
         return {
             "status": "uploaded",
             "request_id": request_id,
-            "filename": file.filename,
-            "file_url": f"/media/{file.filename}",
-            "file_size_kb": round(file_size_kb, 2),
+            "filename": filename,
+            "file_url": f"/media/{filename}",
+            # Rounded to 2 decimals with integer math
+            "file_size_kb": ((file_size * 100 + 512) // 1024) / 100,
+            "sha256": digest,
             "notified_screens": notified
         }
 
     except Exception as e:
         logger.error("=" * 80)
-        logger.error(f"❌ UPLOAD API FAILED | Request ID: {request_id}")
-        logger.error(f"Filename: {file.filename}")
-        logger.error(f"Error: {str(e)}")
+        logger.error("❌ UPLOAD API FAILED | Request ID: %s", request_id)
+        logger.error("Filename: %s", file.filename)
+        logger.error("Error: %s", e)
         logger.error("=" * 80)
 
         return {
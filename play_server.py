@@ -5,6 +5,37 @@ import time
 import pygame
 from datetime import datetime
 import random
+import atexit
+import queue
+import threading
+from collections import OrderedDict
+
+# Optional (Linux only): pip install inotify_simple
+try:
+    from inotify_simple import INotify, flags as inotify_flags
+except ImportError:
+    INotify = None
+
+# Supported media extensions (lowercase, looked up by hash)
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif'})
+VIDEO_EXTENSIONS = frozenset({'.mp4', '.avi', '.mov', '.mkv'})
+
+# Decoded + scaled images kept in memory (full-screen surfaces are ~8 MB each)
+IMAGE_CACHE_SIZE = 8
+
+# Bottom info strip
+OVERLAY_HEIGHT = 60
+
+# Fired by pygame.time.set_timer on the main loop to flush the queue
+QUEUE_CHECK_EVENT = pygame.event.custom_type()
+
+# Played-marks are batched in memory and written at most this often
+QUEUE_FLUSH_INTERVAL = 10  # seconds
+
+def file_extension(name):
+    """'.ext' lowercase मध्ये (नसेल तर '')"""
+    dot = name.rfind('.')
+    return name[dot:].lower() if dot != -1 else ''
 
 class RaspberryMediaPlayer:
     def __init__(self, media_folder="shared_media"):
@@ -12,6 +43,7 @@ class RaspberryMediaPlayer:
         self.images_folder = os.path.join(media_folder, "images")
         self.videos_folder = os.path.join(media_folder, "videos")
         self.queue_file = os.path.join(media_folder, "queue", "media_queue.json")
+        self.scan_cache_file = os.path.join(media_folder, ".scan_cache.json")
         
         # Timing parameters
         self.display_time = {
@@ -24,6 +56,37 @@ class RaspberryMediaPlayer:
         self.loop = True
         self.current_index = 0
         
+        # Scan cache: reused until a media folder's mtime changes
+        self._scan_cache = {}
+        self._media_count = 0
+        self.load_scan_cache()
+        
+        # LRU cache of decoded, converted and scaled image surfaces
+        # (shared with the prefetch thread, hence the lock)
+        self._image_cache = OrderedDict()
+        self._image_cache_lock = threading.Lock()
+        
+        # Next image paths to decode in the background
+        self._prefetch_queue = queue.Queue(maxsize=2)
+        
+        # Random mode: next pick is chosen ahead so it can be prefetched
+        self._random_pick = None
+        
+        # Parsed queue file, reused until its mtime changes
+        self._queue_cache = None
+        self._queue_mtime = 0
+        
+        # Unsaved played-marks, flushed on QUEUE_CHECK_EVENT and at exit
+        self._queue_dirty = False
+        atexit.register(self.flush_media_queue)
+        
+        # With inotify the queue file is only stat'ed after a change event
+        self._queue_watch_active = False
+        self._queue_changed = True
+        
+        # (epoch second, "HH:MM:SS", "dd/mm/YYYY"), re-formatted once per second
+        self._time_cache = (0, "", "")
+        
         # Initialize Pygame for Raspberry Pi
         self.init_pygame_raspberry()
         
@@ -60,11 +123,38 @@ class RaspberryMediaPlayer:
             pygame.display.set_caption("Raspberry Pi Advertisement Display")
             pygame.mouse.set_visible(False)  # Hide mouse cursor
             
+            # Periodic queue flush, delivered as an event (no extra thread)
+            pygame.time.set_timer(QUEUE_CHECK_EVENT, QUEUE_FLUSH_INTERVAL * 1000)
+            
             # Load fonts
             self.font_large = pygame.font.Font(None, 72)
             self.font_medium = pygame.font.Font(None, 48)
             self.font_small = pygame.font.Font(None, 32)
             
+            # Overlay background never changes: build it once
+            self._overlay_bg = pygame.Surface((self.screen_width, OVERLAY_HEIGHT)).convert()
+            self._overlay_bg.set_alpha(180)
+            self._overlay_bg.fill((0, 0, 0))
+            
+            # Rendered overlay text, re-rendered only when the string changes
+            self._last_time_str = None
+            self._time_text = None
+            self._last_media_info = None
+            self._media_text = None
+            
+            # Static strings are rasterized once here; only dynamic text renders at runtime
+            center_x = self.screen_width//2
+            
+            self._s_video_title = self.font_large.render("Video Playback", True, (255, 255, 255)).convert_alpha()
+            self._r_video_title = self._s_video_title.get_rect(center=(center_x, self.screen_height//3))
+            
+            self._s_error = self.font_large.render("ERROR", True, (255, 100, 100)).convert_alpha()
+            self._r_error = self._s_error.get_rect(center=(center_x, self.screen_height//3))
+            
+            # Waiting screen: static parts rendered once, dots animated on top
+            self._waiting_dots = 0
+            self._render_waiting_static()
+            
             print(f"✅ Display initialized: {self.screen_width}x{self.screen_height}")
             
         except Exception as e:
@@ -74,48 +164,95 @@ class RaspberryMediaPlayer:
     def load_media_queue(self):
         """मीडिया क्यू लोड करा"""
         try:
-            if os.path.exists(self.queue_file):
-                with open(self.queue_file, 'r') as f:
-                    queue = json.load(f)
-                print(f"📋 Loaded {len(queue)} media items")
-                return queue
-            else:
+            if self._queue_watch_active and not self._queue_changed and self._queue_cache is not None:
+                return self._queue_cache
+            self._queue_changed = False
+            
+            try:
+                stat = os.stat(self.queue_file)
+            except FileNotFoundError:
                 print("⚠️  Queue file not found")
+                self._queue_cache = None
                 return []
+            
+            # Re-parse only when the file changed on disk
+            if self._queue_cache is not None and stat.st_mtime_ns == self._queue_mtime:
+                return self._queue_cache
+            
+            with open(self.queue_file, 'r') as f:
+                queue = json.load(f)
+            print(f"📋 Loaded {len(queue)} media items")
+            
+            # File changed under us: keep played-marks not flushed yet,
+            # matched per path in order so repeated entries stay distinct
+            if self._queue_dirty and self._queue_cache is not None:
+                marks = {}
+                for old in self._queue_cache:
+                    if old.get('played'):
+                        marks.setdefault(old.get('path'), []).append(old.get('played_at'))
+                for new in queue:
+                    pending = marks.get(new.get('path'))
+                    if pending:
+                        played_at = pending.pop(0)
+                        if not new.get('played'):
+                            new['played'] = True
+                            new['played_at'] = played_at
+            
+            self._queue_cache = queue
+            self._queue_mtime = stat.st_mtime_ns
+            return queue
                 
         except Exception as e:
             print(f"❌ Error loading queue: {e}")
             return []
     
+    def _folder_mtime(self, folder):
+        """फोल्डरचा mtime (नसेल तर None)"""
+        try:
+            return os.stat(folder).st_mtime_ns
+        except OSError:
+            return None
+    
     def scan_local_media(self):
         """लोकल फोल्डरमधून मीडिया शोधा"""
+        # Folder mtime changes whenever a file is added, removed or renamed
+        cache_key = (self._folder_mtime(self.images_folder),
+                     self._folder_mtime(self.videos_folder))
+        if self._scan_cache.get("key") == cache_key:
+            return self._scan_cache["media"]
+        
         media_list = []
         
         # Scan images
-        if os.path.exists(self.images_folder):
-            for filename in os.listdir(self.images_folder):
-                if filename.lower().endswith(('.jpg', '.jpeg', '.png', '.gif')):
-                    media_list.append({
-                        "path": os.path.join(self.images_folder, filename),
-                        "type": "image",
-                        "name": filename
-                    })
+        if cache_key[0] is not None:
+            with os.scandir(self.images_folder) as it:
+                for entry in it:
+                    if file_extension(entry.name) in IMAGE_EXTENSIONS and entry.is_file():
+                        media_list.append({
+                            "path": entry.path,
+                            "type": "image",
+                            "name": entry.name
+                        })
         
         # Scan videos
-        if os.path.exists(self.videos_folder):
-            for filename in os.listdir(self.videos_folder):
-                if filename.lower().endswith(('.mp4', '.avi', '.mov', '.mkv')):
-                    media_list.append({
-                        "path": os.path.join(self.videos_folder, filename),
-                        "type": "video",
-                        "name": filename
-                    })
+        if cache_key[1] is not None:
+            with os.scandir(self.videos_folder) as it:
+                for entry in it:
+                    if file_extension(entry.name) in VIDEO_EXTENSIONS and entry.is_file():
+                        media_list.append({
+                            "path": entry.path,
+                            "type": "video",
+                            "name": entry.name
+                        })
         
         print(f"🔍 Found {len(media_list)} local media files")
+        self._scan_cache = {"key": cache_key, "media": media_list}
+        self._media_count = len(media_list)
+        self.save_scan_cache()
         return media_list
     
-    def get_next_media(self):
-        """पुढील मीडिया मिळवा"""
+    def select_next_media(self):
+        """पुढील मीडिया निवडा (played mark न करता) -> (media, from_queue)"""
         # प्रथम queue मधून मीडिया घ्या
         queue_media = self.load_media_queue()
         
@@ -124,59 +261,198 @@ class RaspberryMediaPlayer:
             unplayed = [m for m in queue_media if not m.get('played', False)]
             
             if unplayed:
-                media = unplayed[0]
-                # Mark as played in queue
-                self.mark_as_played_in_queue(media)
-                return media
+                return unplayed[0], True
         
         # Queue मध्ये नसेल तर local media वरून
         local_media = self.scan_local_media()
         
         if not local_media:
-            return None
+            return None, False
         
         if self.play_mode == "sequential":
-            media = local_media[self.current_index]
-            self.current_index = (self.current_index + 1) % len(local_media)
-        else:  # random
-            media = random.choice(local_media)
+            return local_media[self.current_index % len(local_media)], False
+        
+        # random
+        if self._random_pick not in local_media:
+            self._random_pick = random.choice(local_media)
+        return self._random_pick, False
+    
+    def peek_next_media(self):
+        """पुढील मीडिया पहा (prefetch साठी)"""
+        return self.select_next_media()[0]
+    
+    def load_scan_cache(self):
+        """Disk वरचा scan cache वापरा (फोल्डर बदलले नसतील तर)"""
+        try:
+            with open(self.scan_cache_file, 'r') as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        
+        # Two stats validate the whole list; any change means a normal rescan
+        cache_key = (self._folder_mtime(self.images_folder),
+                     self._folder_mtime(self.videos_folder))
+        if (saved.get("img_mtime"), saved.get("vid_mtime")) != cache_key:
+            return
+        
+        media_list = saved.get("items", [])
+        self._scan_cache = {"key": cache_key, "media": media_list}
+        self._media_count = len(media_list)
+        print(f"⚡ Restored {len(media_list)} media files from scan cache")
+    
+    def save_scan_cache(self):
+        """Scan cache disk वर atomic पद्धतीने लिहा"""
+        img_mtime, vid_mtime = self._scan_cache["key"]
+        tmp_file = self.scan_cache_file + ".tmp"
+        try:
+            with open(tmp_file, 'w') as f:
+                json.dump({
+                    "img_mtime": img_mtime,
+                    "vid_mtime": vid_mtime,
+                    "items": self._scan_cache["media"]
+                }, f)
+            os.replace(tmp_file, self.scan_cache_file)
+        except OSError as e:
+            print(f"⚠️  Could not save scan cache: {e}")
+    
+    def get_next_media(self):
+        """पुढील मीडिया मिळवा"""
+        media, from_queue = self.select_next_media()
+        
+        if media is None:
+            return None
+        
+        if from_queue:
+            # Mark as played in queue
+            self.mark_as_played_in_queue(media)
+        elif self.play_mode == "sequential":
+            self.current_index = (self.current_index + 1) % len(self.scan_local_media())
+        else:
+            self._random_pick = None
         
         return media
     
     def mark_as_played_in_queue(self, media_info):
         """Queue मध्ये played चिन्हांकित करा"""
         try:
-            with open(self.queue_file, 'r') as f:
-                queue = json.load(f)
+            # media_info came from the live cached queue (select_next_media just
+            # loaded it), so mutate that directly - no reload, no stat
+            media_info['played'] = True
+            media_info['played_at'] = datetime.now().isoformat()
             
-            for media in queue:
-                if media.get('path') == media_info.get('path'):
-                    media['played'] = True
-                    media['played_at'] = datetime.now().isoformat()
-                    break
+            # Written later by flush_media_queue
+            self._queue_dirty = True
             
-            with open(self.queue_file, 'w') as f:
-                json.dump(queue, f, indent=2)
-                
         except Exception as e:
             print(f"❌ Error updating queue: {e}")
     
+    def flush_media_queue(self):
+        """Dirty queue असेल तर disk वर लिहा"""
+        if not self._queue_dirty or self._queue_cache is None:
+            return
+        try:
+            # Merge in whatever another writer added since the last parse;
+            # force the stat so a not-yet-seen inotify event can't be missed
+            self._queue_changed = True
+            self.load_media_queue()
+            if self._queue_cache is None:
+                # Queue file removed: nothing left to mark
+                self._queue_dirty = False
+                return
+            
+            # Reload failed to parse (e.g. another writer mid-write): the cache
+            # is stale, so keep the marks dirty and retry on the next tick
+            try:
+                disk_mtime = os.stat(self.queue_file).st_mtime_ns
+            except FileNotFoundError:
+                disk_mtime = None
+            if disk_mtime != self._queue_mtime:
+                print("⚠️  Queue file unreadable, flush postponed")
+                return
+            
+            self.save_media_queue(self._queue_cache)
+            self._queue_dirty = False
+        except Exception as e:
+            print(f"❌ Error saving queue: {e}")
+    
+    def save_media_queue(self, queue):
+        """Queue file atomic पद्धतीने लिहा"""
+        # Write beside the real file, then rename: a power cut never leaves half a JSON
+        tmp_file = self.queue_file + ".tmp"
+        with open(tmp_file, 'w') as f:
+            json.dump(queue, f, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, self.queue_file)
+        
+        # Our own write must not trigger a re-parse
+        self._queue_mtime = os.stat(self.queue_file).st_mtime_ns
+    
+    def load_scaled_image(self, image_path):
+        """इमेज decode + scale करा (LRU cache सह)"""
+        # mtime in the key so a replaced file is decoded again
+        cache_key = (image_path, os.stat(image_path).st_mtime_ns)
+        
+        with self._image_cache_lock:
+            image = self._image_cache.get(cache_key)
+            if image is not None:
+                self._image_cache.move_to_end(cache_key)
+                return image
+        
+        # Load image as 32-bit (smoothscale needs it, palette GIF/PNG included)
+        raw = pygame.image.load(image_path)
+        # Colorkey transparency (GIF, palette PNG) becomes alpha in convert_alpha()
+        has_alpha = bool(raw.get_flags() & pygame.SRCALPHA) or raw.get_colorkey() is not None
+        image = raw.convert_alpha()
+        
+        # Get image dimensions
+        img_width, img_height = image.get_size()
+        
+        # Calculate scaling while maintaining aspect ratio
+        scale = min(self.screen_width/img_width, self.screen_height/img_height)
+        new_width = int(img_width * scale)
+        new_height = int(img_height * scale)
+        
+        # Scale image (skip when already screen-sized; smooth filter only when shrinking)
+        if (new_width, new_height) != (img_width, img_height):
+            scaler = pygame.transform.smoothscale if scale < 1.0 else pygame.transform.scale
+            image = scaler(image, (new_width, new_height))
+        
+        # Opaque images (JPEG etc.) blit fastest in the plain display format
+        if not has_alpha:
+            image = image.convert()
+        
+        with self._image_cache_lock:
+            self._image_cache[cache_key] = image
+            if len(self._image_cache) > IMAGE_CACHE_SIZE:
+                self._image_cache.popitem(last=False)
+        
+        return image
+    
+    def prefetch_worker(self):
+        """पुढील इमेज background मध्ये decode करा"""
+        while True:
+            image_path = self._prefetch_queue.get()
+            try:
+                # Result lands in the LRU cache; display_image picks it up
+                self.load_scaled_image(image_path)
+            except Exception as e:
+                print(f"⚠️  Prefetch failed: {e}")
+    
+    def prefetch_next_media(self):
+        """पुढील मीडिया prefetch साठी queue करा"""
+        media = self.peek_next_media()
+        if media and media["type"] == "image":
+            try:
+                self._prefetch_queue.put_nowait(media["path"])
+            except queue.Full:
+                pass
+    
     def display_image(self, image_path):
         """इमेज display करा"""
         try:
-            # Load image
-            image = pygame.image.load(image_path)
-            
-            # Get image dimensions
-            img_width, img_height = image.get_size()
-            
-            # Calculate scaling while maintaining aspect ratio
-            scale = min(self.screen_width/img_width, self.screen_height/img_height)
-            new_width = int(img_width * scale)
-            new_height = int(img_height * scale)
-            
-            # Scale image
-            image = pygame.transform.scale(image, (new_width, new_height))
+            image = self.load_scaled_image(image_path)
+            new_width, new_height = image.get_size()
             
             # Calculate position to center the image
             x = (self.screen_width - new_width) // 2
@@ -206,9 +482,7 @@ class RaspberryMediaPlayer:
             self.screen.fill((20, 20, 40))
             
             # Show video placeholder
-            title = self.font_large.render("Video Playback", True, (255, 255, 255))
-            title_rect = title.get_rect(center=(self.screen_width//2, self.screen_height//3))
-            self.screen.blit(title, title_rect)
+            self.screen.blit(self._s_video_title, self._r_video_title)
             
             # Show filename
             filename = os.path.basename(video_path)
@@ -237,69 +511,117 @@ class RaspberryMediaPlayer:
             print(f"❌ Error displaying video: {e}")
             return False
     
+    def current_time_strings(self):
+        """वेळ + तारीख strings (एका सेकंदात एकदाच format)"""
+        now_s = int(time.time())
+        if now_s != self._time_cache[0]:
+            now = datetime.now()
+            self._time_cache = (now_s, now.strftime("%H:%M:%S"), now.strftime("%d/%m/%Y"))
+        return self._time_cache[1], self._time_cache[2]
+    
     def show_info_overlay(self, filename, media_type):
         """माहिती overlay दाखवा"""
-        # Create semi-transparent overlay
-        overlay_height = 60
-        overlay = pygame.Surface((self.screen_width, overlay_height))
-        overlay.set_alpha(180)
-        overlay.fill((0, 0, 0))
-        
         # Time and date
-        current_time = datetime.now().strftime("%H:%M:%S")
-        current_date = datetime.now().strftime("%d/%m/%Y")
+        current_time, current_date = self.current_time_strings()
         
-        time_text = self.font_small.render(f"🕒 {current_time} | 📅 {current_date}", 
-                                          True, (200, 200, 200))
+        time_str = f"🕒 {current_time} | 📅 {current_date}"
+        if time_str != self._last_time_str:
+            self._time_text = self.font_small.render(time_str, True, (200, 200, 200))
+            self._last_time_str = time_str
         
         # Media info
         display_time = self.display_time[media_type]
         media_info = f"{'🖼️' if media_type == 'image' else '🎥'} {filename} | ⏱️ {display_time}s"
-        media_text = self.font_small.render(media_info, True, (150, 255, 150))
+        if media_info != self._last_media_info:
+            # Reused for every repeat of this item, so convert once
+            self._media_text = self.font_small.render(media_info, True, (150, 255, 150)).convert_alpha()
+            self._last_media_info = media_info
         
-        # Blit to overlay
-        overlay.blit(time_text, (20, 15))
-        overlay.blit(media_text, (self.screen_width - 600, 15))
+        # Remember what is under the strip so the clock can be redrawn later
+        overlay_rect = pygame.Rect(0, self.screen_height - OVERLAY_HEIGHT,
+                                   self.screen_width, OVERLAY_HEIGHT)
+        self._overlay_under = self.screen.subsurface(overlay_rect).copy()
         
-        # Blit overlay to screen
-        self.screen.blit(overlay, (0, self.screen_height - overlay_height))
+        self._draw_overlay(overlay_rect)
     
-    def show_waiting_screen(self):
-        """प्रतीक्षा स्क्रीन दाखवा"""
-        self.screen.fill((0, 30, 60))
+    def _draw_overlay(self, overlay_rect):
+        """Cached background + text थेट screen वर blit करा"""
+        overlay_y = overlay_rect.y
+        self.screen.blit(self._overlay_bg, (0, overlay_y))
+        self.screen.blit(self._time_text, (20, overlay_y + 15))
+        self.screen.blit(self._media_text, (self.screen_width - 600, overlay_y + 15))
+    
+    def refresh_overlay_clock(self):
+        """फक्त overlay strip मधील घड्याळ update करा"""
+        current_time, current_date = self.current_time_strings()
+        time_str = f"🕒 {current_time} | 📅 {current_date}"
+        if time_str == self._last_time_str:
+            return
+        
+        self._time_text = self.font_small.render(time_str, True, (200, 200, 200))
+        self._last_time_str = time_str
+        
+        overlay_rect = pygame.Rect(0, self.screen_height - OVERLAY_HEIGHT,
+                                   self.screen_width, OVERLAY_HEIGHT)
+        self.screen.blit(self._overlay_under, overlay_rect)
+        self._draw_overlay(overlay_rect)
+        
+        # Only the bottom strip changed: push just that rect to the framebuffer
+        pygame.display.update(overlay_rect)
+    
+    def _render_waiting_static(self):
+        """प्रतीक्षा स्क्रीनचा static भाग एकदाच render करा"""
+        static = pygame.Surface((self.screen_width, self.screen_height)).convert()
+        static.fill((0, 30, 60))
         
         # Title
         title = self.font_large.render("Smart Advertisement System", True, (255, 255, 255))
         title_rect = title.get_rect(center=(self.screen_width//2, self.screen_height//3))
-        self.screen.blit(title, title_rect)
+        static.blit(title, title_rect)
         
         # Status message
         status = self.font_medium.render("Raspberry Pi Display - Waiting for Media", 
                                         True, (200, 200, 200))
         status_rect = status.get_rect(center=(self.screen_width//2, self.screen_height//2))
-        self.screen.blit(status, status_rect)
-        
-        # Loading animation
-        dots = "." * (int(time.time() * 2) % 4)
-        loading = self.font_medium.render(f"Loading{dots}", True, (100, 255, 100))
-        loading_rect = loading.get_rect(center=(self.screen_width//2, self.screen_height//1.8))
-        self.screen.blit(loading, loading_rect)
+        static.blit(status, status_rect)
         
         # Footer info
         footer = self.font_small.render("Press ESC to exit | Media Folder: shared_media", 
                                        True, (150, 150, 200))
         footer_rect = footer.get_rect(center=(self.screen_width//2, self.screen_height - 50))
-        self.screen.blit(footer, footer_rect)
+        static.blit(footer, footer_rect)
+        
+        self._waiting_static = static
+    
+    def _tick_waiting_dots(self):
+        """Loading dots पुढे सरकवा"""
+        self.screen.blit(self._waiting_static, (0, 0))
+        
+        # Loading animation
+        self._waiting_dots = (self._waiting_dots + 1) % 4
+        loading = self.font_medium.render(f"Loading{'.' * self._waiting_dots}", True, (100, 255, 100))
+        loading_rect = loading.get_rect(center=(self.screen_width//2, self.screen_height//1.8))
+        self.screen.blit(loading, loading_rect)
         
         pygame.display.flip()
     
+    def show_waiting_screen(self):
+        """प्रतीक्षा स्क्रीन दाखवा"""
+        self._tick_waiting_dots()
+    
+    def wait_on_waiting_screen(self, seconds):
+        """प्रतीक्षा स्क्रीन 1 Hz ने animate करत थांबा"""
+        for _ in range(seconds):
+            self._tick_waiting_dots()
+            if not self.wait_with_events(1):
+                return False
+        return True
+    
     def show_error_screen(self, error_msg):
         """त्रुटी स्क्रीन दाखवा"""
         self.screen.fill((50, 0, 0))
         
-        error_text = self.font_large.render("ERROR", True, (255, 100, 100))
-        error_rect = error_text.get_rect(center=(self.screen_width//2, self.screen_height//3))
-        self.screen.blit(error_text, error_rect)
+        self.screen.blit(self._s_error, self._r_error)
         
         msg_text = self.font_medium.render(error_msg, True, (255, 200, 200))
         msg_rect = msg_text.get_rect(center=(self.screen_width//2, self.screen_height//2))
@@ -308,19 +630,38 @@ class RaspberryMediaPlayer:
         pygame.display.flip()
         time.sleep(3)
     
-    def auto_refresh_queue(self):
-        """स्वयंचलितपणे queue refresh करा"""
+    def watch_queue_file(self):
+        """inotify वापरून queue file बदल ओळखा"""
+        queue_dir = os.path.dirname(self.queue_file)
+        queue_name = os.path.basename(self.queue_file)
+        
+        try:
+            inotify = INotify()
+            inotify.add_watch(queue_dir, inotify_flags.CLOSE_WRITE | inotify_flags.CREATE |
+                              inotify_flags.MOVED_TO | inotify_flags.DELETE |
+                              inotify_flags.DELETE_SELF | inotify_flags.MOVE_SELF)
+        except OSError as e:
+            print(f"⚠️  inotify unavailable, using mtime polling: {e}")
+            return
+        
+        self._queue_changed = True
+        self._queue_watch_active = True
+        print("👀 Watching queue file with inotify")
+        
+        # Blocks in the kernel until something happens in the queue folder
         while True:
-            time.sleep(5)  # 5 seconds
-            # Queue file changes check
-            try:
-                if hasattr(self, 'last_queue_check'):
-                    current_mtime = os.path.getmtime(self.queue_file)
-                    if current_mtime > self.last_queue_check:
-                        print("🔄 Queue updated, refreshing...")
-                        self.last_queue_check = current_mtime
-            except:
-                pass
+            for event in inotify.read():
+                # Queue folder removed or replaced: the watch is gone for good
+                if event.mask & (inotify_flags.IGNORED | inotify_flags.DELETE_SELF |
+                                 inotify_flags.MOVE_SELF):
+                    self._queue_watch_active = False
+                    self._queue_changed = True
+                    inotify.close()
+                    print("⚠️  Queue folder watch lost, using mtime polling")
+                    return
+                
+                if event.name == queue_name:
+                    self._queue_changed = True
     
     def run(self):
         """मुख्य प्लेयर लूप"""
@@ -336,23 +677,29 @@ class RaspberryMediaPlayer:
         print("• L = Toggle loop")
         print("="*50)
         
-        # Start auto-refresh thread
-        import threading
-        refresh_thread = threading.Thread(target=self.auto_refresh_queue)
-        refresh_thread.daemon = True
-        refresh_thread.start()
+        # Start image prefetch thread
+        prefetch_thread = threading.Thread(target=self.prefetch_worker)
+        prefetch_thread.daemon = True
+        prefetch_thread.start()
+        
+        # Start queue file watcher (falls back to mtime checks without inotify)
+        if INotify is not None:
+            watch_thread = threading.Thread(target=self.watch_queue_file)
+            watch_thread.daemon = True
+            watch_thread.start()
         
         running = True
-        clock = pygame.time.Clock()
         
-        # Initial waiting screen
-        self.show_waiting_screen()
-        time.sleep(2)
+        # Initial waiting screen (ESC / window close ends the wait early)
+        running = self.wait_on_waiting_screen(2)
         
         while running:
             # Event handling
             for event in pygame.event.get():
-                if event.type == pygame.QUIT:
+                if event.type == QUEUE_CHECK_EVENT:
+                    self.flush_media_queue()
+                
+                elif event.type == pygame.QUIT:
                     running = False
                 
                 elif event.type == pygame.KEYDOWN:
@@ -402,54 +749,66 @@ class RaspberryMediaPlayer:
                     success = self.display_video(media["path"])
                 
                 if success:
+                    # Decode the next image while this one is on screen
+                    self.prefetch_next_media()
+                    
                     # Wait for display time
                     display_duration = self.display_time[media["type"]]
-                    self.wait_with_events(display_duration)
+                    self.wait_with_events(display_duration, tick_clock=True)
                 else:
                     # Error, wait a bit and continue
                     self.show_error_screen(f"Failed to load: {media['name']}")
                     time.sleep(3)
             else:
                 # No media found
-                self.show_waiting_screen()
-                time.sleep(2)
+                if not self.wait_on_waiting_screen(2):
+                    running = False
             
             # Check if we should continue
             if not self.loop and hasattr(self, 'played_count'):
-                if self.played_count >= len(self.scan_local_media()):
+                if self.played_count >= self._media_count:
                     print("🛑 Loop disabled, stopping playback")
                     self.show_waiting_screen()
-                    while True:
-                        for event in pygame.event.get():
-                            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
-                                running = False
-                                break
-                        time.sleep(0.1)
-            
-            clock.tick(30)  # 30 FPS
+                    # Sleep until the user quits
+                    while running:
+                        event = pygame.event.wait()
+                        if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                            running = False
         
         # Cleanup
+        self.flush_media_queue()
         pygame.quit()
         print("🛑 Raspberry Pi Media Player stopped")
     
-    def wait_with_events(self, seconds):
+    def wait_with_events(self, seconds, tick_clock=False):
         """इव्हेंट हॅन्डलिंगसह थांबा"""
-        start_time = time.time()
+        deadline = time.monotonic() + seconds
         
-        while time.time() - start_time < seconds:
-            # Check for events
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
+        while True:
+            remaining_ms = int((deadline - time.monotonic()) * 1000)
+            if remaining_ms <= 0:
+                return True
+            
+            # Wake at the next second boundary when the overlay clock is ticking
+            timeout_ms = remaining_ms
+            if tick_clock:
+                timeout_ms = min(remaining_ms, 1000 - int(time.time() * 1000) % 1000)
+            
+            # Sleep until an event arrives or the timeout is over
+            event = pygame.event.wait(max(timeout_ms, 1))
+            
+            if event.type == pygame.NOEVENT:
+                if tick_clock:
+                    self.refresh_overlay_clock()
+            elif event.type == QUEUE_CHECK_EVENT:
+                self.flush_media_queue()
+            elif event.type == pygame.QUIT:
+                return False
+            elif event.type == pygame.KEYDOWN:
+                if event.key == pygame.K_ESCAPE:
                     return False
-                elif event.type == pygame.KEYDOWN:
-                    if event.key == pygame.K_ESCAPE:
-                        return False
-                    elif event.key == pygame.K_SPACE:
-                        return True  # Skip
-            
-            time.sleep(0.1)
-        
-        return True
+                elif event.key == pygame.K_SPACE:
+                    return True  # Skip
 
 # Configuration file
 def load_config():